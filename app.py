@@ -1,69 +1,194 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
-import plotly.express as px
+import concurrent.futures
 import io
+import threading
 import time
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload, MediaIoBaseUpload
-from PIL import Image
-import openpyxl
+
+# plotly.express, PIL and openpyxl are imported lazily inside the functions
+# that use them; Streamlit re-executes this whole script on every
+# interaction, so the import block should stay light.
 
 # ------------ CONFIG ------------
 LABEL_COLUMNS = ["Junk", "LowQuality", "Normal", "Stricture", "Ulcer"]
+# MediaIoBaseDownload/Upload default to 100 KB chunks, i.e. one HTTPS
+# round-trip per 100 KB; 8 MB moves typical files in a single request.
+DRIVE_CHUNK_SIZE = 8 * 1024 * 1024
+# Frames are downscaled to this bounding box before display; Streamlit
+# re-encodes whatever it is given for the browser, so full-resolution
+# frames just waste CPU and bandwidth.
+DISPLAY_MAX_SIZE = (1024, 1024)
+# The 'class' string for every possible combination of the 5 label flags,
+# indexed by the bitmask of set labels (bit i = LABEL_COLUMNS[i]).
+CLASS_STRINGS = np.array([
+    ",".join(lab for i, lab in enumerate(LABEL_COLUMNS) if mask & (1 << i))
+    for mask in range(1 << len(LABEL_COLUMNS))
+], dtype=object)
 
 # ------------ SERVICE ACCOUNT AUTH ------------
 @st.cache_resource
-def init_drive_service():
+def get_drive_credentials():
     """
-    Build and return a Google Drive service instance using service account info.
+    Load the service account credentials once; they are thread-safe to share.
     """
     sa_info = st.secrets["gdrive_service_account"]
-    creds = service_account.Credentials.from_service_account_info(
+    return service_account.Credentials.from_service_account_info(
         sa_info,
         scopes=["https://www.googleapis.com/auth/drive"]
     )
-    service = build('drive', 'v3', credentials=creds)
-    return service
 
-# ------------ DRIVE HELPER FUNCTIONS ------------
-def download_excel_from_drive(drive_service, file_id) -> pd.DataFrame:
+@st.cache_resource
+def _drive_service_store():
+    return threading.local()
+
+def init_drive_service():
     """
-    Download an Excel file from Drive using its file_id and load it into a DataFrame.
+    Build and return a Google Drive service for the current thread.
+
+    googleapiclient's httplib2 transport is not thread-safe, so the main
+    script thread and each prefetch worker get their own service (and thus
+    their own HTTPS connection) instead of sharing one cached instance.
     """
-    if not file_id:
-        return pd.DataFrame()
+    store = _drive_service_store()
+    if not hasattr(store, "service"):
+        store.service = build('drive', 'v3', credentials=get_drive_credentials())
+    return store.service
 
+# ------------ DRIVE HELPER FUNCTIONS ------------
+def download_file_bytes(drive_service, file_id) -> bytes:
+    """
+    Download a file's raw bytes from Drive by file_id.
+    """
     request = drive_service.files().get_media(fileId=file_id)
     fh = io.BytesIO()
-    downloader = MediaIoBaseDownload(fh, request)
+    downloader = MediaIoBaseDownload(fh, request, chunksize=DRIVE_CHUNK_SIZE)
     done = False
     while not done:
         status, done = downloader.next_chunk()
-    fh.seek(0)
-    df = pd.read_excel(fh, engine='openpyxl')
+    return fh.getvalue()
+
+def download_table_from_drive(drive_service, file_id) -> pd.DataFrame:
+    """
+    Download a Parquet file from Drive using its file_id and load it into a DataFrame.
+    """
+    if not file_id:
+        return pd.DataFrame()
+
+    with io.BytesIO(download_file_bytes(drive_service, file_id)) as fh:
+        df = pd.read_parquet(fh, engine='pyarrow')
     return df
 
-def upload_excel_to_drive(drive_service, df: pd.DataFrame, file_id: str):
+def upload_table_to_drive(drive_service, df: pd.DataFrame, file_id: str):
     """
-    Overwrite an Excel file on Drive with the DataFrame content.
+    Overwrite a Parquet file on Drive with the DataFrame content.
     """
     if not file_id:
         st.warning("No file ID specified for uploading. Skipping.")
         return
 
-    excel_buffer = io.BytesIO()
-    df.to_excel(excel_buffer, index=False, engine='openpyxl')
-    excel_buffer.seek(0)
-    media_body = MediaIoBaseUpload(
-        excel_buffer,
-        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
-    update_request = drive_service.files().update(
-        fileId=file_id,
-        media_body=media_body
-    )
-    update_request.execute()
+    with io.BytesIO() as table_buffer:
+        df.to_parquet(table_buffer, engine='pyarrow', compression='zstd')
+        table_buffer.seek(0)
+        media_body = MediaIoBaseUpload(
+            table_buffer,
+            mimetype="application/octet-stream",
+            chunksize=DRIVE_CHUNK_SIZE,
+            resumable=True
+        )
+        update_request = drive_service.files().update(
+            fileId=file_id,
+            media_body=media_body
+        )
+        response = None
+        while response is None:
+            status, response = update_request.next_chunk()
+
+def migrate_xlsx_to_parquet(drive_service, xlsx_file_id: str, parquet_file_id: str):
+    """
+    One-shot migration helper: read a legacy Excel file from Drive and rewrite
+    it as Parquet into an existing (possibly empty) Drive file.
+    """
+    import openpyxl
+
+    with io.BytesIO(download_file_bytes(drive_service, xlsx_file_id)) as fh:
+        # read_only streams rows and skips the style/shared-string machinery
+        # that makes a full openpyxl workbook load expensive.
+        wb = openpyxl.load_workbook(fh, read_only=True, data_only=True)
+        rows = wb.active.values
+        header = next(rows)
+        df = pd.DataFrame(rows, columns=header)
+        wb.close()
+    upload_table_to_drive(drive_service, df, parquet_file_id)
+
+def upload_delta_to_drive(drive_service, df_delta: pd.DataFrame, folder_id: str):
+    """
+    Append a Parquet file with only the changed rows to the deltas folder,
+    so a save ships O(changes) bytes instead of the whole frames table.
+    """
+    file_name = f"labels_delta_{time.strftime('%Y%m%d_%H%M%S')}.parquet"
+    with io.BytesIO() as delta_buffer:
+        df_delta.to_parquet(delta_buffer, engine='pyarrow', compression='zstd')
+        delta_buffer.seek(0)
+        media_body = MediaIoBaseUpload(
+            delta_buffer,
+            mimetype="application/octet-stream",
+            chunksize=DRIVE_CHUNK_SIZE,
+            resumable=True
+        )
+        create_request = drive_service.files().create(
+            body={'name': file_name, 'parents': [folder_id]},
+            media_body=media_body
+        )
+        response = None
+        while response is None:
+            status, response = create_request.next_chunk()
+
+def list_delta_files(drive_service, folder_id: str):
+    """
+    List delta files (file_id, file_name) in the deltas folder, sorted by
+    name so older deltas apply first (the name embeds the save timestamp).
+    """
+    files_list = []
+    page_token = None
+    query = f"'{folder_id}' in parents and name contains 'labels_delta_'"
+    while True:
+        response = drive_service.files().list(
+            q=query,
+            spaces='drive',
+            fields='nextPageToken, files(id, name)',
+            pageSize=1000,
+            pageToken=page_token
+        ).execute()
+        for f in response.get('files', []):
+            files_list.append((f['id'], f['name']))
+        page_token = response.get('nextPageToken', None)
+        if page_token is None:
+            break
+    return sorted(files_list, key=lambda f: f[1])
+
+def apply_label_deltas(drive_service, df_frames: pd.DataFrame, delta_files) -> pd.DataFrame:
+    """
+    Overlay the given delta files (as returned by list_delta_files) onto the
+    frames snapshot, newest last so the most recent labeling of a frame wins.
+    """
+    deltas = [download_table_from_drive(drive_service, file_id)
+              for file_id, _ in delta_files]
+    if deltas:
+        df_frames = pd.concat([df_frames] + deltas, ignore_index=True)
+        df_frames = df_frames.drop_duplicates('frame', keep='last')
+    return df_frames
+
+def delete_delta_files(drive_service, delta_files):
+    """
+    Delete exactly the given delta files — never a fresh listing, so deltas
+    another session uploaded in the meantime are left for the next compaction.
+    """
+    for file_id, _ in delta_files:
+        drive_service.files().delete(fileId=file_id).execute()
 
 def list_frames_in_folder(drive_service, folder_id: str):
     """
@@ -77,6 +202,7 @@ def list_frames_in_folder(drive_service, folder_id: str):
             q=query,
             spaces='drive',
             fields='nextPageToken, files(id, name)',
+            pageSize=1000,
             pageToken=page_token
         ).execute()
         for f in response.get('files', []):
@@ -86,34 +212,44 @@ def list_frames_in_folder(drive_service, folder_id: str):
             break
     return files_list
 
-def download_image(drive_service, file_id):
-    """
-    Download an image from Drive by file_id and return a PIL Image.
-    """
-    request = drive_service.files().get_media(fileId=file_id)
-    fh = io.BytesIO()
-    downloader = MediaIoBaseDownload(fh, request)
-    done = False
-    while not done:
-        status, done = downloader.next_chunk()
-    fh.seek(0)
-    return Image.open(fh)
-
 # ------------ CACHED VERSIONS ------------
-@st.cache_data(ttl=3600)
-def cached_download_excel(file_id: str) -> pd.DataFrame:
-    drive_service = init_drive_service()
-    return download_excel_from_drive(drive_service, file_id)
-
 @st.cache_data(ttl=3600)
 def cached_list_frames(folder_id: str):
     drive_service = init_drive_service()
     return list_frames_in_folder(drive_service, folder_id)
 
-@st.cache_data(show_spinner=False)
-def cached_download_image(file_id: str):
+@st.cache_data(show_spinner=False, max_entries=512, persist="disk")
+def cached_image_bytes(file_id: str) -> bytes:
+    """
+    Raw image bytes, persisted to disk so revisited frames survive app
+    restarts without another Drive round-trip.
+    """
     drive_service = init_drive_service()
-    return download_image(drive_service, file_id)
+    return download_file_bytes(drive_service, file_id)
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def cached_download_image(file_id: str):
+    """
+    Decoded PIL image, downscaled to DISPLAY_MAX_SIZE for display.
+    """
+    from PIL import Image
+
+    with io.BytesIO(cached_image_bytes(file_id)) as bio:
+        img = Image.open(bio)
+        # For JPEGs, draft() downscales at the DCT level during decode
+        # (roughly free); it is a no-op for other formats.
+        img.draft('RGB', DISPLAY_MAX_SIZE)
+        # thumbnail() forces the lazy decode, so the buffer can close here.
+        img.thumbnail(DISPLAY_MAX_SIZE, Image.Resampling.BILINEAR)
+    return img
+
+@st.cache_data(ttl=3600)
+def cached_frame_name_to_id(folder_id: str) -> dict:
+    """
+    Map file_name -> file_id for all frames in the folder, so lookups are O(1)
+    instead of a linear scan on every rerun.
+    """
+    return {name: fid for fid, name in cached_list_frames(folder_id)}
 
 # ------------ Excel / LABELING LOGIC ------------
 def ensure_columns(df: pd.DataFrame) -> pd.DataFrame:
@@ -121,89 +257,148 @@ def ensure_columns(df: pd.DataFrame) -> pd.DataFrame:
     for col in base_cols + LABEL_COLUMNS:
         if col not in df.columns:
             df[col] = None
+    # Compact dtypes: one byte per label cell instead of a boxed Python object,
+    # and dictionary-encoded movie/pillcam so filter comparisons run on codes.
+    # 'class' stays object because every save writes new combined values.
+    df[LABEL_COLUMNS] = df[LABEL_COLUMNS].fillna(0).astype('int8')
+    for col in ["movie", "pillcam"]:
+        df[col] = df[col].astype('category')
     return df
 
 def sync_unlabeled(df_frames, df_unlabeled, all_frame_files):
-    existing_frames = set(df_frames['frame'].dropna().unique())
-    unlabeled_frames = set(df_unlabeled['frame'].dropna().unique())
-    new_records = []
-    for (file_id, file_name) in all_frame_files:
-        if file_name not in existing_frames and file_name not in unlabeled_frames:
-            new_records.append({"frame": file_name})
-    if new_records:
-        df_unlabeled = pd.concat([df_unlabeled, pd.DataFrame(new_records)], ignore_index=True)
+    existing_frames = set(df_frames['frame'].dropna())
+    unlabeled_frames = set(df_unlabeled['frame'].dropna())
+    all_names = {file_name for _, file_name in all_frame_files}
+    new_names = all_names - existing_frames - unlabeled_frames
+    if new_names:
+        df_new = pd.DataFrame({"frame": sorted(new_names)})
+        if df_unlabeled.empty:
+            df_unlabeled = ensure_columns(df_new)
+        else:
+            df_unlabeled = pd.concat([df_unlabeled, df_new], ignore_index=True)
     return df_unlabeled
 
 def merge_temp_labels(df_frames, df_unlabeled):
     temp_labels = st.session_state.get("temp_labels", {})
     if not temp_labels:
         st.info("No changes to save.")
-        return df_frames, df_unlabeled, 0
-
-    changed_count = 0
-    for frame_name, label_dict in temp_labels.items():
-        if frame_name in df_frames['frame'].values:
-            idx = df_frames.index[df_frames['frame'] == frame_name][0]
-            for lab_col in LABEL_COLUMNS:
-                df_frames.at[idx, lab_col] = label_dict.get(lab_col, 0)
-            assigned = [k for k, v in label_dict.items() if v == 1]
-            df_frames.at[idx, 'class'] = assigned[0] if len(assigned) == 1 else ",".join(assigned) if assigned else ""
-            df_frames.at[idx, 'label_date'] = time.strftime('%Y-%m-%d %H:%M:%S')
-            changed_count += 1
-        else:
-            new_row = {
-                'frame': frame_name,
-                'movie': "",
-                'pillcam': "",
-                'label_date': time.strftime('%Y-%m-%d %H:%M:%S')
-            }
-            for lab_col in LABEL_COLUMNS:
-                new_row[lab_col] = label_dict.get(lab_col, 0)
-            assigned = [k for k, v in label_dict.items() if v == 1]
-            new_row['class'] = ",".join(assigned) if assigned else ""
-            df_frames = pd.concat([df_frames, pd.DataFrame([new_row])], ignore_index=True)
-            df_unlabeled = df_unlabeled[df_unlabeled['frame'] != frame_name]
-            changed_count += 1
+        return df_frames, df_unlabeled, 0, pd.DataFrame()
+
+    # Build one updates table from the session changes and apply it in bulk
+    # instead of scanning df_frames once per changed frame.
+    updates = pd.DataFrame.from_dict(temp_labels, orient='index')
+    updates.index.name = 'frame'
+    updates = updates.reindex(columns=LABEL_COLUMNS).fillna(0).astype('int8')
+    label_masks = updates[LABEL_COLUMNS].to_numpy() @ (1 << np.arange(len(LABEL_COLUMNS)))
+    updates['class'] = CLASS_STRINGS[label_masks]
+    now_str = time.strftime('%Y-%m-%d %H:%M:%S')
+    updates['label_date'] = now_str
+
+    df_frames = df_frames.set_index('frame')
+    existing = updates.index.intersection(df_frames.index)
+    new = updates.index.difference(df_frames.index)
+
+    update_cols = LABEL_COLUMNS + ['class', 'label_date']
+    df_frames.loc[existing, update_cols] = updates.loc[existing, update_cols]
+
+    if len(new) > 0:
+        new_rows = updates.loc[new].copy()
+        new_rows['movie'] = ""
+        new_rows['pillcam'] = ""
+        df_frames = pd.concat([df_frames, new_rows])
+        df_unlabeled = df_unlabeled[~df_unlabeled['frame'].isin(new)]
+
+    df_frames = df_frames.reset_index()
+    changed_count = len(updates)
+    df_changed = df_frames[df_frames['frame'].isin(updates.index)]
 
     st.session_state["temp_labels"] = {}
-    return df_frames, df_unlabeled, changed_count
+    return df_frames, df_unlabeled, changed_count, df_changed
 
 # ------------ STREAMLIT UI FUNCTIONS ------------
+@st.cache_data
+def filter_options(n_frames: int, n_unlabeled: int, _df_frames, _df_unlabeled):
+    """
+    Compute the Movie/Pillcam selectbox options. Keyed on the table lengths
+    (the underscore args are not hashed) so the options are rebuilt only when
+    rows are added, not on every widget click.
+    """
+    movies = sorted(set(_df_frames['movie'].dropna().unique()) |
+                    set(_df_unlabeled['movie'].dropna().unique()))
+    pillcams = sorted(set(_df_frames['pillcam'].dropna().unique()) |
+                      set(_df_unlabeled['pillcam'].dropna().unique()))
+    return movies, pillcams
+
 def sidebar_filters(df_frames, df_unlabeled):
     st.sidebar.header("Filters")
     status = st.sidebar.radio("Show Which?", ["All", "Labeled", "Unlabeled"])
-    combined = pd.concat([df_frames, df_unlabeled], ignore_index=True)
-    movies = sorted(list(combined['movie'].dropna().unique()))
+    movies, pillcams = filter_options(len(df_frames), len(df_unlabeled), df_frames, df_unlabeled)
     movie_filter = st.sidebar.selectbox("Movie", ["All"] + movies)
-    pillcams = sorted(list(combined['pillcam'].dropna().unique()))
     pillcam_filter = st.sidebar.selectbox("Pillcam", ["All"] + pillcams)
     label_sel = st.sidebar.multiselect("Has Label(s)?", LABEL_COLUMNS)
     return status, movie_filter, pillcam_filter, label_sel
 
 def apply_filters(df_frames, df_unlabeled, status, movie_filter, pillcam_filter, label_sel):
-    df_frames = df_frames.copy()
-    df_frames["is_labeled"] = True
-    df_unlabeled = df_unlabeled.copy()
-    df_unlabeled["is_labeled"] = False
-
+    # No up-front copies: the is_labeled tag is only meaningful on the
+    # combined view, and the filters below never mutate in place.
     if status == "All":
-        df_show = pd.concat([df_frames, df_unlabeled], ignore_index=True)
+        df_show = pd.concat(
+            [df_frames.assign(is_labeled=True), df_unlabeled.assign(is_labeled=False)],
+            ignore_index=True
+        )
     elif status == "Labeled":
         df_show = df_frames
     else:
         df_show = df_unlabeled
 
+    # Accumulate all filters into one mask and slice once, instead of
+    # materializing an intermediate frame per active filter.
+    mask = np.ones(len(df_show), dtype=bool)
     if movie_filter != "All":
-        df_show = df_show[df_show['movie'] == movie_filter]
+        mask &= (df_show['movie'].values == movie_filter)
     if pillcam_filter != "All":
-        df_show = df_show[df_show['pillcam'] == pillcam_filter]
+        mask &= (df_show['pillcam'].values == pillcam_filter)
     if label_sel:
-        for lab in label_sel:
-            if lab in df_show.columns:
-                df_show = df_show[df_show[lab] == 1]
+        sel_cols = [lab for lab in label_sel if lab in df_show.columns]
+        if sel_cols:
+            # One pass over a packed int8 matrix instead of a filter-and-copy
+            # per selected label.
+            mask &= (df_show[sel_cols].fillna(0).to_numpy(dtype='int8') == 1).all(axis=1)
+    if not mask.all():
+        df_show = df_show[mask]
     return df_show
 
-def navigation(df):
+def get_prefetch_executor():
+    if "prefetch_executor" not in st.session_state:
+        st.session_state["prefetch_executor"] = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+    return st.session_state["prefetch_executor"]
+
+def warm_image_cache(file_ids):
+    """
+    Download the given images concurrently so later cached_download_image
+    calls hit the cache. Fire-and-forget; results land in the cache store.
+    """
+    executor = get_prefetch_executor()
+    for file_id in file_ids:
+        if file_id:
+            executor.submit(cached_download_image, file_id)
+
+def prefetch_neighbor_images(df, idx, name_to_id, thumb_name_to_id):
+    """
+    Warm the image cache for the frames around idx in background threads so
+    Next/Previous render without waiting for a Drive round-trip.
+    """
+    # Nearest neighbors first so the most likely next click wins the pool.
+    offsets = (1, -1, 2, -2, 3, -3)
+    neighbors = [df.iloc[idx + o]['frame'] for o in offsets if 0 <= idx + o < len(df)]
+    # Prefetch whatever display_frame will show: the thumbnail if one
+    # exists, the original otherwise.
+    warm_image_cache(
+        thumb_name_to_id.get(thumb_name(frame)) or name_to_id.get(frame)
+        for frame in neighbors
+    )
+
+def navigation(df, name_to_id, thumb_name_to_id):
     st.write(f"Found {len(df)} frame(s) after filtering.")
     if len(df) == 0:
         return None
@@ -220,15 +415,24 @@ def navigation(df):
 
     idx = st.session_state.current_index
     row = df.iloc[idx]
+    prefetch_neighbor_images(df, idx, name_to_id, thumb_name_to_id)
     return row
 
-def display_frame(row, all_files):
+def thumb_name(frame_name: str) -> str:
+    """
+    Name of the pregenerated WebP thumbnail for a frame (same stem, .webp).
+    """
+    return frame_name.rsplit('.', 1)[0] + ".webp"
+
+def display_frame(row, name_to_id, thumb_name_to_id):
     st.subheader(f"Frame: {row['frame']}")
-    file_id = None
-    for (fid, fname) in all_files:
-        if fname == row['frame']:
-            file_id = fid
-            break
+    file_id = name_to_id.get(row['frame'])
+
+    # Prefer the small WebP thumbnail when a thumbs folder is configured;
+    # the checkbox falls back to the original file.
+    thumb_id = thumb_name_to_id.get(thumb_name(row['frame']))
+    if thumb_id and not st.checkbox("View full resolution", value=False):
+        file_id = thumb_id
 
     if file_id:
         # Use the cached image download function
@@ -255,23 +459,33 @@ def labeling_ui(row):
 
     st.session_state["temp_labels"][frame_name] = updated_dict
 
+@st.cache_data(show_spinner=False)
+def label_distribution_fig(counts: tuple):
+    import plotly.express as px
+
+    dist_df = pd.DataFrame({"label": LABEL_COLUMNS, "count": list(counts)})
+    return px.pie(dist_df, names="label", values="count", title="Label Distribution")
+
+@st.cache_data(show_spinner=False)
+def labeled_vs_unlabeled_fig(labeled_count: int, unlabeled_count: int):
+    import plotly.express as px
+
+    data = pd.DataFrame({
+        'status': ['Labeled', 'Unlabeled'],
+        'count': [labeled_count, unlabeled_count]
+    })
+    return px.pie(data, names='status', values='count', title="Labeled vs Unlabeled")
+
 def show_visualizations(df_frames, df_unlabeled):
     st.subheader("Visualizations")
     tab1, tab2 = st.tabs(["Label Distribution", "Labeled vs Unlabeled"])
     with tab1:
-        counts = {lab: df_frames[lab].sum() if lab in df_frames.columns else 0 for lab in LABEL_COLUMNS}
-        dist_df = pd.DataFrame({"label": list(counts.keys()), "count": list(counts.values())})
-        fig1 = px.pie(dist_df, names="label", values="count", title="Label Distribution")
-        st.plotly_chart(fig1, use_container_width=True)
+        # The cheap count tuple keys the figure cache, so px.pie only
+        # reruns when the labels actually change.
+        counts = tuple(int(c) for c in df_frames.reindex(columns=LABEL_COLUMNS, fill_value=0).sum())
+        st.plotly_chart(label_distribution_fig(counts), use_container_width=True)
     with tab2:
-        labeled_count = len(df_frames)
-        unlabeled_count = len(df_unlabeled)
-        data = pd.DataFrame({
-            'status': ['Labeled', 'Unlabeled'],
-            'count': [labeled_count, unlabeled_count]
-        })
-        fig2 = px.pie(data, names='status', values='count', title="Labeled vs Unlabeled")
-        st.plotly_chart(fig2, use_container_width=True)
+        st.plotly_chart(labeled_vs_unlabeled_fig(len(df_frames), len(df_unlabeled)), use_container_width=True)
 
 def show_usage_description():
     st.markdown(
@@ -283,13 +497,13 @@ def show_usage_description():
         2. **Automatic detection of new (unlabeled) frames** in the Drive folder.  
         3. **Filtering** by Movie, Pillcam, or any label.  
         4. **Visualizations** (Pie Charts for Label Distribution and Labeled vs. Unlabeled).  
-        5. **Saves changes** back to Excel on Google Drive.
+        5. **Saves changes** back to Parquet files on Google Drive.
 
         ---  
         **How to Use**  
         1. **Navigate** through frames using the "Previous" and "Next" buttons.  
         2. **Toggle** checkboxes to assign or remove labels for each frame.  
-        3. Click **"Update Excel"** to commit your label changes (the updated file overwrites the original Excel file on Drive).  
+        3. Click **"Update Labels"** to commit your label changes (the updated file overwrites the original Parquet file on Drive).
         4. Check the **Visualizations** tabs to see distribution of labels and labeled/unlabeled stats.
         """
     )
@@ -301,40 +515,98 @@ def main():
     folder_id = st.secrets["gdrive"]["frames_folder_id"]
     frames_ds_file_id = st.secrets["gdrive"]["frames_ds_file_id"]
     unlabeled_file_id = st.secrets["gdrive"].get("unlabeled_file_id", None)
-
-    # Load Excel files via cached functions
-    df_frames = cached_download_excel(frames_ds_file_id)
-    df_frames = ensure_columns(df_frames)
-    df_unlabeled = cached_download_excel(unlabeled_file_id)
-    df_unlabeled = ensure_columns(df_unlabeled)
+    thumbs_folder_id = st.secrets["gdrive"].get("thumbs_folder_id", None)
+    deltas_folder_id = st.secrets["gdrive"].get("deltas_folder_id", None)
+
+    # Explicit refresh: drop the session tables and folder listings, but
+    # leave the image caches alone.
+    if st.sidebar.button("Reload data from Drive"):
+        st.session_state.pop("df_frames", None)
+        st.session_state.pop("df_unlabeled", None)
+        cached_list_frames.clear()
+        cached_frame_name_to_id.clear()
+        # Keyed on table lengths, so a reload that changes movie/pillcam
+        # values without changing row counts would otherwise serve stale
+        # dropdown options.
+        filter_options.clear()
+        st.rerun()
+
+    # Load Parquet tables once per session; they live in session_state so
+    # saving does not have to blow away the (large) image cache.
+    if "df_frames" not in st.session_state:
+        df_frames_loaded = download_table_from_drive(drive_service, frames_ds_file_id)
+        df_unlabeled_loaded = download_table_from_drive(drive_service, unlabeled_file_id)
+        if deltas_folder_id:
+            delta_files = list_delta_files(drive_service, deltas_folder_id)
+            df_frames_loaded = apply_label_deltas(drive_service, df_frames_loaded, delta_files)
+            # Frames labeled through deltas are no longer unlabeled even if
+            # the unlabeled snapshot on Drive still lists them.
+            if not df_unlabeled_loaded.empty:
+                df_unlabeled_loaded = df_unlabeled_loaded[
+                    ~df_unlabeled_loaded['frame'].isin(df_frames_loaded['frame'])
+                ]
+        st.session_state["df_frames"] = ensure_columns(df_frames_loaded)
+        st.session_state["df_unlabeled"] = ensure_columns(df_unlabeled_loaded)
+    df_frames = st.session_state["df_frames"]
+    df_unlabeled = st.session_state["df_unlabeled"]
 
     # List all frame files using cache
     all_files = cached_list_frames(folder_id)
+    name_to_id = cached_frame_name_to_id(folder_id)
+    thumb_name_to_id = cached_frame_name_to_id(thumbs_folder_id) if thumbs_folder_id else {}
     df_unlabeled = sync_unlabeled(df_frames, df_unlabeled, all_files)
+    st.session_state["df_unlabeled"] = df_unlabeled
 
     # Sidebar filters and apply filtering
     status, movie_filter, pillcam_filter, label_sel = sidebar_filters(df_frames, df_unlabeled)
     df_display = apply_filters(df_frames, df_unlabeled, status, movie_filter, pillcam_filter, label_sel)
 
-    row = navigation(df_display)
+    row = navigation(df_display, name_to_id, thumb_name_to_id)
     if row is not None:
-        display_frame(row, all_files)
+        display_frame(row, name_to_id, thumb_name_to_id)
         labeling_ui(row)
 
     st.divider()
 
-    # Update Excel on Drive and clear caches to load fresh data next time
-    if st.button("Update Excel"):
-        df_frames, df_unlabeled, changed_count = merge_temp_labels(df_frames, df_unlabeled)
+    # Update the tables on Drive; session_state keeps the merged result so
+    # nothing else needs to be invalidated.
+    if st.button("Update Labels"):
+        n_unlabeled_before = len(df_unlabeled)
+        df_frames, df_unlabeled, changed_count, df_changed = merge_temp_labels(df_frames, df_unlabeled)
+        st.session_state["df_frames"] = df_frames
+        st.session_state["df_unlabeled"] = df_unlabeled
         if changed_count > 0:
-            upload_excel_to_drive(drive_service, df_frames, frames_ds_file_id)
-            if unlabeled_file_id:
-                upload_excel_to_drive(drive_service, df_unlabeled, unlabeled_file_id)
+            if deltas_folder_id:
+                # Append only the changed rows; the snapshot and unlabeled
+                # table are rewritten on the next compaction.
+                upload_delta_to_drive(drive_service, df_changed, deltas_folder_id)
+            else:
+                upload_table_to_drive(drive_service, df_frames, frames_ds_file_id)
+                # The unlabeled table only shrinks when a previously unlabeled
+                # frame got its first label; skip the upload otherwise.
+                if unlabeled_file_id and len(df_unlabeled) != n_unlabeled_before:
+                    upload_table_to_drive(drive_service, df_unlabeled, unlabeled_file_id)
             st.success(f"Updated {changed_count} frame(s).")
-            st.cache_data.clear()  # Invalidate cache after updates
         else:
             st.info("No changes to commit.")
 
+    # Fold accumulated deltas back into the snapshot and delete them.
+    if deltas_folder_id and st.sidebar.button("Compact label deltas"):
+        # Re-list and overlay the deltas as they exist right now, so labels
+        # saved by other sessions since this session loaded are merged into
+        # the snapshot; only the files listed here are deleted afterwards.
+        delta_files = list_delta_files(drive_service, deltas_folder_id)
+        df_frames = ensure_columns(apply_label_deltas(drive_service, df_frames, delta_files))
+        if not df_unlabeled.empty:
+            df_unlabeled = df_unlabeled[~df_unlabeled['frame'].isin(df_frames['frame'])]
+        st.session_state["df_frames"] = df_frames
+        st.session_state["df_unlabeled"] = df_unlabeled
+        upload_table_to_drive(drive_service, df_frames, frames_ds_file_id)
+        if unlabeled_file_id:
+            upload_table_to_drive(drive_service, df_unlabeled, unlabeled_file_id)
+        delete_delta_files(drive_service, delta_files)
+        st.sidebar.success("Snapshot compacted.")
+
     show_visualizations(df_frames, df_unlabeled)
     show_usage_description()
 
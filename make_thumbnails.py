@@ -0,0 +1,31 @@
+"""
+One-shot helper: generate 512x512 WebP thumbnails for a local folder of frames.
+
+Upload the output folder to Drive and set `gdrive.thumbs_folder_id` in the
+Streamlit secrets; the app will then serve thumbnails by default and only
+fetch originals on "View full resolution".
+
+Usage: python make_thumbnails.py <frames_dir> <out_dir>
+"""
+import sys
+from pathlib import Path
+from PIL import Image
+
+THUMB_SIZE = (512, 512)
+FRAME_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp"}
+
+def main():
+    if len(sys.argv) != 3:
+        print(__doc__.strip())
+        sys.exit(1)
+    frames_dir, out_dir = Path(sys.argv[1]), Path(sys.argv[2])
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for path in sorted(frames_dir.iterdir()):
+        if path.suffix.lower() not in FRAME_SUFFIXES:
+            continue
+        img = Image.open(path)
+        img.thumbnail(THUMB_SIZE)
+        img.save(out_dir / (path.stem + ".webp"), quality=80, method=6)
+
+if __name__ == "__main__":
+    main()